@@ -2,11 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
+import errno
+import functools
 import logging
 import struct
-from dataclasses import dataclass
-from enum import Enum
-from itertools import takewhile
+import threading
+import weakref
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Iterator
 
 import usb.core
 import usb.util
@@ -22,172 +30,360 @@ _ENDPOINT_IN = 0x85
 _ENDPOINT_OUT = 0x05
 _INTERFACE = 6
 _TIMEOUT_MS = 3000  # `SAVE_VALUES` response can take over 2 seconds.
-_EQ_PRESETS = [1, 2, 3]
-_EQ_PRESET_BANDS = [1, 2, 3, 4, 5]
+# Requests are at most 64 bytes, including the 3 byte header.
+_MAX_PAYLOAD_LENGTH = 61
+_EQ_PRESETS = frozenset({1, 2, 3})
+_EQ_PRESET_BANDS = frozenset({1, 2, 3, 4, 5})
 _DB_OFFSET = 12
+# Translates offset gain bytes to decibels, to be unpacked as signed bytes.
+_DB_TRANSLATION = bytes((i - _DB_OFFSET) & 0xFF for i in range(256))
 _EQ_PRESET_MIN_GAIN = -7
 _EQ_PRESET_MAX_GAIN = 7
 _EQ_PRESET_MIN_CENTER_FREQ = 80
 _EQ_PRESET_MAX_CENTER_FREQ = 15_000
 _EQ_PRESET_MIN_BANDWIDTH = int(4096 * 0.1)
 _EQ_PRESET_MAX_BANDWIDTH = int(4096 * 3.0)
-_MIC_EQ_PRESETS = [0, 1, 2]
+# Leaves room in the payload for the preset, length and null terminator.
+_EQ_PRESET_MAX_NAME_LENGTH = _MAX_PAYLOAD_LENGTH - 3
+_MIC_EQ_PRESETS = frozenset({0, 1, 2})
+# Payloads of requests whose only argument is the `saved` flag, indexed by it.
+_SAVED_PAYLOADS = (b"\x00", b"\x01")
+_GET_EQ_PRESET_GAIN_STRUCT = struct.Struct("<10b")
+_GET_EQ_PRESET_FREQ_AND_BW_STRUCT = struct.Struct("<4H")
+_SET_EQ_PRESET_FREQ_AND_BW_STRUCT = struct.Struct("<BBHH")
 
 
 class Device:
     """Astro A50 gen 4 USB device."""
 
     def __init__(self) -> None:
-        self._dev = usb.core.find(idVendor=_VENDOR, idProduct=_PRODUCT)
-        if self._dev is None:
-            raise DeviceNotConnected
-        if self._dev.is_kernel_driver_active(_INTERFACE):
-            self._dev.detach_kernel_driver(_INTERFACE)
+        self._handle = _open_handle()
+        # Bound once, since every request calls them.
+        self._write = self._handle.dev.write
+        self._read = self._handle.dev.read
+        # Responses are read into a reusable buffer, guarded by the handle lock.
+        self._in_buf = array("B", bytes(64))
+        self._in_view = memoryview(self._in_buf)
+        # Submitted requests are performed in order by a single I/O thread.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="eh-fifty"
+        )
+        self._closed = False
+
+    def __enter__(self) -> Device:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the device.
+
+        Waits for any submitted requests to complete first. The USB device is
+        only released once every `Device` using it has been closed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown()
+        if _release_handle(self._handle):
+            usb.util.dispose_resources(self._handle.dev)
+
+    @contextmanager
+    def batch(self, max_queued: int | None = None) -> Iterator[_Batch]:
+        """Queue commands to be performed in order by the I/O thread.
+
+        The returned batch has the same `get_*`, `set_*` and `save_values`
+        methods as the device, but each one returns a `Future` immediately
+        instead of blocking. On exiting the context, wait for all the queued
+        commands to complete, and then raise the exception of the first one
+        that failed, if any.
+
+        If `max_queued` is set, queuing a command blocks while that many of the
+        batch's commands are waiting or being performed. This only limits the
+        depth of the queue: the device performs one request at a time
+        regardless.
+        """
+        if max_queued is not None and max_queued < 1:
+            raise ValueError(f"max_queued must be at least 1, not {max_queued}")
+        batch = _Batch(self, self._executor, max_queued)
+        try:
+            yield batch
+        finally:
+            batch.wait()
+        batch.check()
+
+    def snapshot(self) -> Snapshot:
+        """Get the statuses and all active configuration values.
+
+        The device has no request for reading several values at once, so the
+        reads are queued back to back on the I/O thread.
+        """
+        with self.batch() as batch:
+            battery_status = batch.get_battery_status()
+            headset_status = batch.get_headset_status()
+            balance = batch.get_balance()
+            default_balance = batch.get_default_balance()
+            alert_volume = batch.get_alert_volume()
+            noise_gate_mode = batch.get_noise_gate_mode()
+            mic_eq = batch.get_mic_eq()
+            slider_values = {
+                slider_type: batch.get_slider_value(slider_type)
+                for slider_type in SliderType
+            }
+            active_eq_preset = batch.get_active_eq_preset()
+            eq_preset_names = {
+                preset: batch.get_eq_preset_name(preset) for preset in _EQ_PRESETS
+            }
+            eq_preset_gains = {
+                preset: batch.get_eq_preset_gain(preset) for preset in _EQ_PRESETS
+            }
+            eq_preset_freqs_and_bws = {
+                preset: {
+                    band: batch.get_eq_preset_freq_and_bw(preset, band)
+                    for band in _EQ_PRESET_BANDS
+                }
+                for preset in _EQ_PRESETS
+            }
+        return Snapshot(
+            battery_status=battery_status.result(),
+            headset_status=headset_status.result(),
+            balance=balance.result(),
+            default_balance=default_balance.result(),
+            alert_volume=alert_volume.result(),
+            noise_gate_mode=noise_gate_mode.result(),
+            mic_eq=mic_eq.result(),
+            slider_values={
+                slider_type: value.result()
+                for slider_type, value in slider_values.items()
+            },
+            active_eq_preset=active_eq_preset.result(),
+            eq_preset_names={
+                preset: name.result() for preset, name in eq_preset_names.items()
+            },
+            eq_preset_gains={
+                preset: gain.result() for preset, gain in eq_preset_gains.items()
+            },
+            eq_preset_freqs_and_bws={
+                preset: {
+                    band: freq_and_bw.result() for band, freq_and_bw in bands.items()
+                }
+                for preset, bands in eq_preset_freqs_and_bws.items()
+            },
+        )
 
     def _request(
-        self, request_type: _CommandType, payload: list[int] | None = None
+        self,
+        request_type: _CommandType,
+        payload: bytes = b"",
+        length: int | None = None,
+        echo: bytes = b"",
     ) -> bytes:
-        request = [0x02, request_type.value]
+        """Perform a request and return the response payload.
+
+        If `length` is given, the response payload must be exactly that long. If
+        `echo` is given, the response payload must start with it.
+        """
+        if self._closed:
+            raise RuntimeError("Device is closed")
+        if len(payload) > _MAX_PAYLOAD_LENGTH:
+            raise ValueError(f"{request_type.name} request is too long")
+        # pyusb sends an `array('B')` as is, but converts anything else to one
+        # only after a failed attempt to treat it as a length.
+        request = array("B", (0x02, request_type))
         if payload:
-            request.extend([len(payload), *payload])
-        assert len(request) <= 64
-        LOGGER.debug("Writing %s request\n%s", request_type, hexdump(request))
-        assert self._dev.write(_ENDPOINT_OUT, request, _TIMEOUT_MS) == len(request)
+            request.append(len(payload))
+            request.frombytes(payload)
+        debug = LOGGER.isEnabledFor(logging.DEBUG)
+        with self._handle.lock:
+            if debug:
+                LOGGER.debug(
+                    "Writing %s request\n%s", request_type.name, hexdump(request)
+                )
+            try:
+                read = self._transfer(request_type, request)
+            except usb.core.USBError as error:
+                if error.errno == errno.ENODEV:
+                    # The device was unplugged, so it must be found again.
+                    _discard_handle(self._handle)
+                raise
+            resp = self._in_buf
+            if debug:
+                LOGGER.debug(
+                    "Received %s response\n%s", request_type.name, hexdump(resp[:read])
+                )
+            if read < 3 or resp[0] != 0x02:
+                raise ProtocolError(f"Malformed {request_type.name} response")
+            if resp[1] not in _SUCCESS_STATUSES:
+                raise ProtocolError(f"{request_type.name} request failed")
+            end = 3 + resp[2]
+            # The buffer is reused, so anything past the end of the response is
+            # left over from a previous one.
+            if end > read:
+                raise ProtocolError(f"Truncated {request_type.name} response")
+            # The payload must be copied out of the buffer before the lock is
+            # released.
+            resp_payload = self._in_view[3:end].tobytes()
+        if length is not None and len(resp_payload) != length:
+            raise ProtocolError(
+                f"Expected {length} byte {request_type.name} response, "
+                f"got {len(resp_payload)}"
+            )
+        if not resp_payload.startswith(echo):
+            raise ProtocolError(f"Unexpected {request_type.name} response")
+        return resp_payload
+
+    def _transfer(self, request_type: _CommandType, request: array[int]) -> int:
+        """Write a request and read its response into the read buffer.
+
+        Returns the length of the response.
+        """
+        written = self._write(_ENDPOINT_OUT, request, _TIMEOUT_MS)
+        if written != len(request):
+            raise ProtocolError(f"Short write of {request_type.name} request")
 
         try:
-            resp: bytes = self._dev.read(_ENDPOINT_IN, 64, _TIMEOUT_MS)
+            read: int = self._read(_ENDPOINT_IN, self._in_buf, _TIMEOUT_MS)
         except usb.core.USBTimeoutError:
             # Resetting the device after a timeout is necessary to avoid
             # getting garbage in subsequent responses.
             LOGGER.warning("Resetting device due to timeout")
-            self._dev.reset()
+            self._handle.dev.reset()
             raise
-        LOGGER.debug("Received %s response\n%s", request_type, hexdump(resp))
-        assert resp[0] == 0x02
-        assert resp[1] in {_ResponseStatus.NO_RESPONSE.value, _ResponseStatus.OK.value}
-        length = resp[2]
-        return bytes(resp[3 : 3 + length])
+        return read
 
     def get_active_eq_preset(self) -> int:
         """Get the active EQ preset."""
-        resp = self._request(_CommandType.GET_ACTIVE_EQ_PRESET)
-        assert len(resp) == 1
-        assert resp[0] in _EQ_PRESETS
+        resp = self._request(_CommandType.GET_ACTIVE_EQ_PRESET, length=1)
+        if resp[0] not in _EQ_PRESETS:
+            raise ProtocolError(f"Invalid active EQ preset {resp[0]}")
         return resp[0]
 
     def set_active_eq_preset(self, preset: int) -> None:
         """Set the active EQ preset."""
-        assert preset in _EQ_PRESETS
-        resp = self._request(_CommandType.SET_ACTIVE_EQ_PRESET, [preset])
-        assert len(resp) == 2
-        assert resp[0] == _CommandType.SET_ACTIVE_EQ_PRESET.value
-        assert resp[1] == preset
+        _check_choice("preset", preset, _EQ_PRESETS)
+        self._request(
+            _CommandType.SET_ACTIVE_EQ_PRESET,
+            bytes((preset,)),
+            length=2,
+            echo=bytes((_CommandType.SET_ACTIVE_EQ_PRESET, preset)),
+        )
 
     def get_eq_preset_name(self, preset: int, saved: bool = False) -> str:
         """Get an EQ preset name.
 
         If `saved=True`, return the saved name instead of the active name.
         """
-        assert preset in _EQ_PRESETS
-        resp = self._request(_CommandType.GET_EQ_PRESET_NAME, [preset, int(saved)])
-        assert len(resp) > 2
-        assert resp[0] == _CommandType.GET_EQ_PRESET_NAME.value
-        assert resp[1] == preset
-        preset_name = takewhile(lambda c: c > 0, resp[2:])
-        return bytes(preset_name).decode()
+        _check_choice("preset", preset, _EQ_PRESETS)
+        resp = self._request(
+            _CommandType.GET_EQ_PRESET_NAME,
+            bytes((preset, saved)),
+            echo=bytes((_CommandType.GET_EQ_PRESET_NAME, preset)),
+        )
+        if len(resp) <= 2:
+            raise ProtocolError("Empty EQ preset name response")
+        return resp[2:].partition(b"\x00")[0].decode()
 
     def set_eq_preset_name(self, preset: int, name: str) -> None:
         """Set an EQ preset name."""
-        assert preset in _EQ_PRESETS
-        encoded_name = name.encode() + b"\x00"
-        resp = self._request(
+        _check_choice("preset", preset, _EQ_PRESETS)
+        encoded_name = name.encode()
+        if len(encoded_name) > _EQ_PRESET_MAX_NAME_LENGTH:
+            raise ValueError(
+                f"name must be at most {_EQ_PRESET_MAX_NAME_LENGTH} bytes when "
+                f"encoded, not {len(encoded_name)}"
+            )
+        encoded_name += b"\x00"
+        self._request(
             _CommandType.SET_EQ_PRESET_NAME,
-            [preset, len(encoded_name), *encoded_name],
+            bytes((preset, len(encoded_name))) + encoded_name,
+            length=2,
+            echo=bytes((_CommandType.SET_EQ_PRESET_NAME, preset)),
         )
-        assert len(resp) == 2
-        assert resp[0] == _CommandType.SET_EQ_PRESET_NAME.value
-        assert resp[1] == preset
 
     def get_eq_preset_gain(self, preset: int) -> EQPresetGain:
         """Get the gain for each band in an EQ preset."""
-        assert preset in _EQ_PRESETS
-        resp = self._request(_CommandType.GET_EQ_PRESET_GAIN, [preset])
-        assert len(resp) == 12
-        assert resp[0] == _CommandType.GET_EQ_PRESET_GAIN.value
-        assert resp[1] == preset
-        values = list(struct.iter_unpack("<BBBBB", resp[2:]))
-        return EQPresetGain(
-            gain=[db - _DB_OFFSET for db in values[0]],
-            saved_gain=[db - _DB_OFFSET for db in values[1]],
+        _check_choice("preset", preset, _EQ_PRESETS)
+        resp = self._request(
+            _CommandType.GET_EQ_PRESET_GAIN,
+            bytes((preset,)),
+            length=12,
+            echo=bytes((_CommandType.GET_EQ_PRESET_GAIN, preset)),
+        )
+        values = _GET_EQ_PRESET_GAIN_STRUCT.unpack_from(
+            resp.translate(_DB_TRANSLATION), 2
         )
+        return EQPresetGain(gain=list(values[:5]), saved_gain=list(values[5:]))
 
     def set_eq_preset_gain(self, preset: int, gain: list[int]) -> None:
         """Set the gain for each band in an EQ preset."""
-        assert preset in _EQ_PRESETS
-        assert len(gain) == 5
-        assert all(
-            _EQ_PRESET_MIN_GAIN <= band_gain <= _EQ_PRESET_MAX_GAIN
-            for band_gain in gain
-        )
-        resp = self._request(
+        _check_choice("preset", preset, _EQ_PRESETS)
+        if len(gain) != 5:
+            raise ValueError(f"gain must have 5 bands, not {len(gain)}")
+        for band_gain in gain:
+            _check_range("gain", band_gain, _EQ_PRESET_MIN_GAIN, _EQ_PRESET_MAX_GAIN)
+        self._request(
             _CommandType.SET_EQ_PRESET_GAIN,
-            [preset, *[band_gain + _DB_OFFSET for band_gain in gain]],
+            bytes((preset, *(band_gain + _DB_OFFSET for band_gain in gain))),
+            length=2,
+            echo=bytes((_CommandType.SET_EQ_PRESET_GAIN, preset)),
         )
-        assert len(resp) == 2
-        assert resp[0] == _CommandType.SET_EQ_PRESET_GAIN.value
-        assert resp[1] == preset
 
     def get_eq_preset_freq_and_bw(self, preset: int, band: int) -> EQPresetFreqAndBW:
         """Get the frequency and bandwidth of a band in an EQ preset."""
-        assert preset in _EQ_PRESETS
-        assert band in _EQ_PRESET_BANDS
-        resp = self._request(_CommandType.GET_EQ_PRESET_FREQ_AND_BW, [preset, band])
-        assert len(resp) == 11
-        assert resp[0] == _CommandType.GET_EQ_PRESET_FREQ_AND_BW.value
-        assert resp[1] == preset
-        assert resp[2] == band
-        values = list(value for value, in struct.iter_unpack("<H", resp[3:]))
+        _check_choice("preset", preset, _EQ_PRESETS)
+        _check_choice("band", band, _EQ_PRESET_BANDS)
+        resp = self._request(
+            _CommandType.GET_EQ_PRESET_FREQ_AND_BW,
+            bytes((preset, band)),
+            length=11,
+            echo=bytes((_CommandType.GET_EQ_PRESET_FREQ_AND_BW, preset, band)),
+        )
+        bandwidth, saved_bandwidth, center_freq, saved_center_freq = (
+            _GET_EQ_PRESET_FREQ_AND_BW_STRUCT.unpack_from(resp, 3)
+        )
         return EQPresetFreqAndBW(
-            bandwidth=values[0],
-            saved_bandwidth=values[1],
-            center_freq=values[2],
-            saved_center_freq=values[3],
+            bandwidth=bandwidth,
+            saved_bandwidth=saved_bandwidth,
+            center_freq=center_freq,
+            saved_center_freq=saved_center_freq,
         )
 
     def set_eq_preset_freq_and_bw(
         self, preset: int, band: int, center_freq: int, bandwidth: int
     ) -> None:
         """Set the frequency and bandwidth of a band in an EQ preset."""
-        assert preset in _EQ_PRESETS
-        assert band in _EQ_PRESET_BANDS
-        assert _EQ_PRESET_MIN_CENTER_FREQ <= center_freq <= _EQ_PRESET_MAX_CENTER_FREQ
+        _check_choice("preset", preset, _EQ_PRESETS)
+        _check_choice("band", band, _EQ_PRESET_BANDS)
+        _check_range(
+            "center_freq",
+            center_freq,
+            _EQ_PRESET_MIN_CENTER_FREQ,
+            _EQ_PRESET_MAX_CENTER_FREQ,
+        )
         if band in {1, 5}:
-            assert bandwidth == 0
+            if bandwidth != 0:
+                raise ValueError(f"bandwidth must be 0 for band {band}")
         else:
-            assert _EQ_PRESET_MIN_BANDWIDTH <= bandwidth <= _EQ_PRESET_MAX_BANDWIDTH
-        resp = self._request(
+            _check_range(
+                "bandwidth",
+                bandwidth,
+                _EQ_PRESET_MIN_BANDWIDTH,
+                _EQ_PRESET_MAX_BANDWIDTH,
+            )
+        self._request(
             _CommandType.SET_EQ_PRESET_FREQ_AND_BW,
-            [
-                preset,
-                band,
-                *struct.pack("<H", bandwidth),
-                *struct.pack("<H", center_freq),
-            ],
+            _SET_EQ_PRESET_FREQ_AND_BW_STRUCT.pack(
+                preset, band, bandwidth, center_freq
+            ),
+            length=4,
+            echo=bytes((_CommandType.SET_EQ_PRESET_FREQ_AND_BW, preset, band, 0)),
         )
-        assert len(resp) == 4
-        assert resp[0] == _CommandType.SET_EQ_PRESET_FREQ_AND_BW.value
-        assert resp[1] == preset
-        assert resp[2] == band
-        assert resp[3] == 0
 
     def get_battery_status(self) -> BatteryStatus:
         """Get the battery status."""
-        resp = self._request(_CommandType.GET_BATTERY_STATUS)
-        assert len(resp) == 1
-        return BatteryStatus(
-            is_charging=bool(resp[0] & 128),
-            charge_percent=resp[0] & 127,
-        )
+        resp = self._request(_CommandType.GET_BATTERY_STATUS, length=1)
+        return _BATTERY_STATUSES[resp[0]]
 
     def get_balance(self) -> int:
         """Get the balance.
@@ -198,9 +394,7 @@ class Device:
         This value is the same as the default balance, until the buttons on the
         headset have adjusted it.
         """
-        resp = self._request(_CommandType.GET_BALANCE)
-        assert len(resp) == 1
-        assert 0 <= resp[0] <= 255
+        resp = self._request(_CommandType.GET_BALANCE, length=1)
         return resp[0]
 
     def get_default_balance(self, saved: bool = False) -> int:
@@ -211,9 +405,9 @@ class Device:
 
         If `saved=True`, return the saved value instead of the active value.
         """
-        resp = self._request(_CommandType.GET_DEFAULT_BALANCE, [int(saved)])
-        assert len(resp) == 1
-        assert 0 <= resp[0] <= 255
+        resp = self._request(
+            _CommandType.GET_DEFAULT_BALANCE, _SAVED_PAYLOADS[saved], length=1
+        )
         return resp[0]
 
     def set_default_balance(self, balance: int) -> None:
@@ -222,53 +416,65 @@ class Device:
         Balance is represented by integer in range 0 (100% game audio) to 255
         (100% chat audio).
         """
-        assert 0 <= balance <= 255
-        resp = self._request(_CommandType.SET_DEFAULT_BALANCE, [balance])
-        assert len(resp) == 1
-        assert resp[0] == _CommandType.SET_DEFAULT_BALANCE.value
+        _check_range("balance", balance, 0, 255)
+        self._request(
+            _CommandType.SET_DEFAULT_BALANCE,
+            bytes((balance,)),
+            length=1,
+            echo=bytes((_CommandType.SET_DEFAULT_BALANCE,)),
+        )
 
     def get_headset_status(self) -> HeadsetStatus:
         """Get the headset status."""
-        resp = self._request(_CommandType.GET_HEADSET_STATUS)
-        assert len(resp) == 1
-        return HeadsetStatus(
-            is_docked=bool(resp[0] & 0x01),
-            is_on=bool(resp[0] & 0x02),
-        )
+        resp = self._request(_CommandType.GET_HEADSET_STATUS, length=1)
+        return _HEADSET_STATUSES[resp[0]]
 
     def get_alert_volume(self, saved: bool = False) -> int:
         """Get the alert volume as percent.
 
         If `saved=True`, return the saved value instead of the active value.
         """
-        resp = self._request(_CommandType.GET_ALERT_VOLUME, [int(saved)])
-        assert len(resp) == 1
-        assert 0 <= resp[0] <= 100
+        resp = self._request(
+            _CommandType.GET_ALERT_VOLUME, _SAVED_PAYLOADS[saved], length=1
+        )
+        if resp[0] > 100:
+            raise ProtocolError(f"Invalid alert volume {resp[0]}")
         return resp[0]
 
     def set_alert_volume(self, volume_percent: int) -> None:
         """Set the alert volume as percent."""
-        assert 0 <= volume_percent <= 100
-        resp = self._request(_CommandType.SET_ALERT_VOLUME, [volume_percent])
-        assert len(resp) == 1
-        assert resp[0] == _CommandType.SET_ALERT_VOLUME.value
+        _check_range("volume_percent", volume_percent, 0, 100)
+        self._request(
+            _CommandType.SET_ALERT_VOLUME,
+            bytes((volume_percent,)),
+            length=1,
+            echo=bytes((_CommandType.SET_ALERT_VOLUME,)),
+        )
 
     def get_noise_gate_mode(self, saved: bool = False) -> NoiseGateMode:
         """Get the noise gate mode.
 
         If `saved=True`, return the saved value instead of the active value.
         """
-        resp = self._request(_CommandType.GET_NOISE_GATE_MODE)
-        assert len(resp) == 3
-        assert resp[0] == _CommandType.GET_NOISE_GATE_MODE.value
-        return NoiseGateMode(resp[1 + int(saved)])
+        resp = self._request(
+            _CommandType.GET_NOISE_GATE_MODE,
+            length=3,
+            echo=bytes((_CommandType.GET_NOISE_GATE_MODE,)),
+        )
+        return NoiseGateMode(resp[1 + saved])
 
     def set_noise_gate_mode(self, noise_gate_mode: NoiseGateMode) -> None:
         """Set the noise gate mode."""
-        assert isinstance(noise_gate_mode, NoiseGateMode)
-        resp = self._request(_CommandType.SET_NOISE_GATE_MODE, [noise_gate_mode.value])
-        assert len(resp) == 1
-        assert resp[0] == noise_gate_mode.value
+        if not isinstance(noise_gate_mode, NoiseGateMode):
+            raise TypeError(
+                f"noise_gate_mode must be a NoiseGateMode, not {noise_gate_mode!r}"
+            )
+        self._request(
+            _CommandType.SET_NOISE_GATE_MODE,
+            bytes((noise_gate_mode,)),
+            length=1,
+            echo=bytes((noise_gate_mode,)),
+        )
 
     def get_mic_eq(self, saved: bool = False) -> int:
         """Get the microphone EQ preset.
@@ -277,54 +483,233 @@ class Device:
 
         If `saved=True`, return the saved value instead of the active value.
         """
-        resp = self._request(_CommandType.GET_MIC_EQ, [int(saved)])
-        assert len(resp) == 1
-        assert resp[0] in _MIC_EQ_PRESETS
+        resp = self._request(_CommandType.GET_MIC_EQ, _SAVED_PAYLOADS[saved], length=1)
+        if resp[0] not in _MIC_EQ_PRESETS:
+            raise ProtocolError(f"Invalid microphone EQ preset {resp[0]}")
         return resp[0]
 
     def set_mic_eq(self, mic_eq: int) -> None:
         """Set the microphone EQ preset."""
-        assert mic_eq in _MIC_EQ_PRESETS
-        resp = self._request(_CommandType.SET_MIC_EQ, [mic_eq])
-        assert len(resp) == 1
-        assert resp[0] == _CommandType.SET_MIC_EQ.value
+        _check_choice("mic_eq", mic_eq, _MIC_EQ_PRESETS)
+        self._request(
+            _CommandType.SET_MIC_EQ,
+            bytes((mic_eq,)),
+            length=1,
+            echo=bytes((_CommandType.SET_MIC_EQ,)),
+        )
 
     def get_slider_value(self, slider_type: SliderType, saved: bool = False) -> int:
         """Get slider slider value.
 
         If `saved=True`, return the saved value instead of the active value.
         """
-        assert isinstance(slider_type, SliderType)
-        resp = self._request(_CommandType.GET_SLIDER_VALUE, [slider_type.value])
-        assert len(resp) == 4
-        assert resp[0] == _CommandType.GET_SLIDER_VALUE.value
-        assert resp[1] == slider_type.value
-        return resp[2 + int(saved)]
+        if not isinstance(slider_type, SliderType):
+            raise TypeError(f"slider_type must be a SliderType, not {slider_type!r}")
+        resp = self._request(
+            _CommandType.GET_SLIDER_VALUE,
+            bytes((slider_type,)),
+            length=4,
+            echo=bytes((_CommandType.GET_SLIDER_VALUE, slider_type)),
+        )
+        return resp[2 + saved]
 
     def set_slider_value(self, slider_type: SliderType, value_percent: int) -> None:
         """Set a slider value as percent."""
-        assert isinstance(slider_type, SliderType)
-        assert 0 <= value_percent <= 100
-        resp = self._request(
-            _CommandType.SET_SLIDER_VALUE, [slider_type.value, value_percent]
+        if not isinstance(slider_type, SliderType):
+            raise TypeError(f"slider_type must be a SliderType, not {slider_type!r}")
+        _check_range("value_percent", value_percent, 0, 100)
+        self._request(
+            _CommandType.SET_SLIDER_VALUE,
+            bytes((slider_type, value_percent)),
+            length=2,
+            echo=bytes((_CommandType.SET_SLIDER_VALUE, slider_type)),
         )
-        assert len(resp) == 2
-        assert resp[0] == _CommandType.SET_SLIDER_VALUE.value
-        assert resp[1] == slider_type.value
 
     def save_values(self) -> None:
         """Save the active configuration values."""
-        resp = self._request(_CommandType.SAVE_VALUES)
-        assert len(resp) == 2
-        assert resp[0] == _CommandType.SAVE_VALUES.value
-        assert resp[1] == 0x00
+        self._request(
+            _CommandType.SAVE_VALUES,
+            length=2,
+            echo=bytes((_CommandType.SAVE_VALUES, 0x00)),
+        )
+
+
+class _Batch:
+    """Commands queued by `Device.batch`."""
+
+    def __init__(
+        self, device: Device, executor: ThreadPoolExecutor, max_queued: int | None
+    ) -> None:
+        self._device = device
+        self._executor = executor
+        self._semaphore = (
+            None if max_queued is None else threading.BoundedSemaphore(max_queued)
+        )
+        self._futures: list[Future[Any]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., Future[Any]]:
+        # Checked first, since the instance may not be initialised yet, such as
+        # while it is being copied.
+        _check_command_name(name)
+        submit_command = _command_submitter(self._executor, self._device, name)
+
+        def submit(*args: Any, **kwargs: Any) -> Future[Any]:
+            semaphore = self._semaphore
+            if semaphore is not None:
+                semaphore.acquire()  # pylint: disable=consider-using-with
+            future = submit_command(*args, **kwargs)
+            if semaphore is not None:
+                future.add_done_callback(lambda _: semaphore.release())
+            self._futures.append(future)
+            return future
+
+        return submit
+
+    def wait(self) -> None:
+        """Wait for all the queued commands to complete."""
+        wait(self._futures)
+
+    def check(self) -> None:
+        """Raise the exception of the first queued command that failed, if any."""
+        for future in self._futures:
+            error = future.exception()
+            if error is not None:
+                raise error
+
+
+class AsyncDevice:
+    """Astro A50 gen 4 USB device, for use with asyncio.
+
+    Has the same `get_*`, `set_*` and `save_values` methods as `Device`, as
+    coroutine functions. Commands are performed in order by the I/O thread of
+    the wrapped device.
+    """
+
+    def __init__(self, device: Device | None = None) -> None:
+        self._device = Device() if device is None else device
+        self._executor = self._device._executor  # pylint: disable=protected-access
+
+    async def __aenter__(self) -> AsyncDevice:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Release the device.
+
+        Waits for any submitted commands to complete first.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._device.close)
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        # Checked first, since the instance may not be initialised yet, such as
+        # while it is being copied.
+        _check_command_name(name)
+        submit_command = _command_submitter(self._executor, self._device, name)
+
+        async def command(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.wrap_future(submit_command(*args, **kwargs))
+
+        return command
+
+
+def _check_command_name(name: str) -> None:
+    """Raise `AttributeError` unless `name` is the name of a device command."""
+    if not name.startswith(("get_", "set_", "save_")):
+        raise AttributeError(name)
+
+
+def _command_submitter(
+    executor: ThreadPoolExecutor, device: Device, name: str
+) -> Callable[..., Future[Any]]:
+    """Return a function that queues the named device command on `executor`."""
+    return functools.partial(executor.submit, getattr(device, name))
+
+
+@dataclass
+class _Handle:
+    """USB device handle, shared by every `Device` using the same device."""
+
+    dev: usb.core.Device
+    # Responses can only be matched to requests by order, so each request must
+    # complete before the next one is written.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Number of open `Device` objects using the handle.
+    users: int = 0
+
+
+# Open handles, kept for as long as any `Device` is using them.
+_HANDLES: weakref.WeakValueDictionary[tuple[int, int], _Handle] = (
+    weakref.WeakValueDictionary()
+)
+_HANDLES_LOCK = threading.Lock()
+
+
+def _open_handle() -> _Handle:
+    """Return a handle for the device, reusing an open one if there is one.
+
+    Reusing a handle avoids enumerating the USB bus again.
+    """
+    key = (_VENDOR, _PRODUCT)
+    with _HANDLES_LOCK:
+        handle = _HANDLES.get(key)
+        if handle is None:
+            dev = usb.core.find(idVendor=_VENDOR, idProduct=_PRODUCT)
+            if dev is None:
+                raise DeviceNotConnected
+            if dev.is_kernel_driver_active(_INTERFACE):
+                dev.detach_kernel_driver(_INTERFACE)
+            handle = _HANDLES[key] = _Handle(dev)
+        handle.users += 1
+        return handle
+
+
+def _release_handle(handle: _Handle) -> bool:
+    """Stop using a handle, and return whether it is no longer in use.
+
+    A handle that is no longer in use is about to be disposed, so it is not
+    reused for new `Device` objects.
+    """
+    key = (_VENDOR, _PRODUCT)
+    with _HANDLES_LOCK:
+        handle.users -= 1
+        if handle.users:
+            return False
+        if _HANDLES.get(key) is handle:
+            del _HANDLES[key]
+        return True
+
+
+def _discard_handle(handle: _Handle) -> None:
+    """Stop reusing a handle for new `Device` objects."""
+    key = (_VENDOR, _PRODUCT)
+    with _HANDLES_LOCK:
+        if _HANDLES.get(key) is handle:
+            del _HANDLES[key]
 
 
 class DeviceNotConnected(Exception):
     """Device not connected."""
 
 
-class _CommandType(Enum):
+class ProtocolError(Exception):
+    """Device sent an unexpected response."""
+
+
+def _check_choice(name: str, value: int, choices: frozenset[int]) -> None:
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {sorted(choices)}, not {value!r}")
+
+
+def _check_range(name: str, value: int, minimum: int, maximum: int) -> None:
+    if not minimum <= value <= maximum:
+        raise ValueError(
+            f"{name} must be in range {minimum} to {maximum}, not {value!r}"
+        )
+
+
+class _CommandType(IntEnum):
 
     GET_HEADSET_STATUS = 0x54
     SAVE_VALUES = 0x61
@@ -350,15 +735,35 @@ class _CommandType(Enum):
     GET_BATTERY_STATUS = 0x7C
 
 
-class _ResponseStatus(Enum):
+class _ResponseStatus(IntEnum):
 
     NO_RESPONSE = 0
     ERROR = 1
     OK = 2
 
 
-@dataclass
-class EQPresetGain:
+_SUCCESS_STATUSES = frozenset({_ResponseStatus.NO_RESPONSE, _ResponseStatus.OK})
+
+
+class _FrozenSlots:
+    """Base for frozen dataclasses with `__slots__`.
+
+    Copying and unpickling restore slots using `setattr`, which frozen
+    dataclasses forbid, so the state is restored directly instead.
+    """
+
+    __slots__: tuple[str, ...] = ()
+
+    def __getstate__(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: tuple[Any, ...]) -> None:
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+
+@dataclass(frozen=True)
+class EQPresetGain(_FrozenSlots):
     """The gain for each band of an EQ preset.
 
     Each list contains the gain for the band at the corresponding index.
@@ -366,12 +771,14 @@ class EQPresetGain:
     Gain is represented in decibels and may vary from -7 to 7 dB.
     """
 
+    __slots__ = ("gain", "saved_gain")
+
     gain: list[int]
     saved_gain: list[int]
 
 
-@dataclass
-class EQPresetFreqAndBW:
+@dataclass(frozen=True)
+class EQPresetFreqAndBW(_FrozenSlots):
     """Frequency and bandwidth for single band of an EQ preset.
 
     Bandwidth is a multiple of the center frequency, which has been quantized
@@ -380,13 +787,15 @@ class EQPresetFreqAndBW:
     Center frequency is represented by hertz.
     """
 
+    __slots__ = ("bandwidth", "saved_bandwidth", "center_freq", "saved_center_freq")
+
     bandwidth: int
     saved_bandwidth: int
     center_freq: int
     saved_center_freq: int
 
 
-class NoiseGateMode(Enum):
+class NoiseGateMode(IntEnum):
     """Noise gate mode."""
 
     STREAMING = 0x00
@@ -395,7 +804,7 @@ class NoiseGateMode(Enum):
     TOURNAMENT = 0x03
 
 
-class SliderType(Enum):
+class SliderType(IntEnum):
     """Slider type."""
 
     STREAM_PORT_MIX_MIC = 0x00
@@ -406,17 +815,68 @@ class SliderType(Enum):
     SIDE_TONE = 0x05
 
 
-@dataclass
-class BatteryStatus:
+@dataclass(frozen=True)
+class BatteryStatus(_FrozenSlots):
     """Headset battery status."""
 
+    __slots__ = ("is_charging", "charge_percent")
+
     is_charging: bool
     charge_percent: int
 
 
-@dataclass
-class HeadsetStatus:
+@dataclass(frozen=True)
+class HeadsetStatus(_FrozenSlots):
     """Headset status."""
 
+    __slots__ = ("is_on", "is_docked")
+
     is_on: bool
     is_docked: bool
+
+
+@dataclass(frozen=True)
+class Snapshot(_FrozenSlots):  # pylint: disable=too-many-instance-attributes
+    """Statuses and active configuration values of a device.
+
+    The EQ preset dictionaries are keyed by preset, and then by band.
+    """
+
+    __slots__ = (
+        "battery_status",
+        "headset_status",
+        "balance",
+        "default_balance",
+        "alert_volume",
+        "noise_gate_mode",
+        "mic_eq",
+        "slider_values",
+        "active_eq_preset",
+        "eq_preset_names",
+        "eq_preset_gains",
+        "eq_preset_freqs_and_bws",
+    )
+
+    battery_status: BatteryStatus
+    headset_status: HeadsetStatus
+    balance: int
+    default_balance: int
+    alert_volume: int
+    noise_gate_mode: NoiseGateMode
+    mic_eq: int
+    slider_values: dict[SliderType, int]
+    active_eq_preset: int
+    eq_preset_names: dict[int, str]
+    eq_preset_gains: dict[int, EQPresetGain]
+    eq_preset_freqs_and_bws: dict[int, dict[int, EQPresetFreqAndBW]]
+
+
+# Statuses are decoded from a single byte, so every possible status is built
+# once up front.
+_BATTERY_STATUSES = tuple(
+    BatteryStatus(is_charging=bool(i & 0x80), charge_percent=i & 0x7F)
+    for i in range(256)
+)
+_HEADSET_STATUSES = tuple(
+    HeadsetStatus(is_on=bool(i & 0x02), is_docked=bool(i & 0x01)) for i in range(256)
+)
@@ -3,9 +3,13 @@
 WARNING: Running these tests will randomize your device's configuration.
 """
 
+import asyncio
+import copy
+import pickle
 import random
 import string
 import time
+from typing import Iterator
 
 import pytest
 
@@ -14,11 +18,13 @@ from eh_fifty import (
     _EQ_PRESET_MAX_BANDWIDTH,
     _EQ_PRESET_MAX_CENTER_FREQ,
     _EQ_PRESET_MAX_GAIN,
+    _EQ_PRESET_MAX_NAME_LENGTH,
     _EQ_PRESET_MIN_BANDWIDTH,
     _EQ_PRESET_MIN_CENTER_FREQ,
     _EQ_PRESET_MIN_GAIN,
     _EQ_PRESETS,
     _MIC_EQ_PRESETS,
+    AsyncDevice,
     Device,
     NoiseGateMode,
     SliderType,
@@ -28,8 +34,9 @@ from eh_fifty import (
 
 
 @pytest.fixture(name="device", scope="session")
-def _device() -> Device:
-    return Device()
+def _device() -> Iterator[Device]:
+    with Device() as device:
+        yield device
 
 
 def test_alert_volume(device: Device) -> None:
@@ -59,12 +66,12 @@ def test_noise_gate_mode(device: Device) -> None:
 
 
 def test_mic_eq(device: Device) -> None:
-    saved_mic_eq = random.choice(_MIC_EQ_PRESETS)
+    saved_mic_eq = random.choice(sorted(_MIC_EQ_PRESETS))
     device.set_mic_eq(saved_mic_eq)
 
     device.save_values()
 
-    active_mic_eq = random.choice(_MIC_EQ_PRESETS)
+    active_mic_eq = random.choice(sorted(_MIC_EQ_PRESETS))
     device.set_mic_eq(active_mic_eq)
 
     assert device.get_mic_eq() == active_mic_eq
@@ -95,7 +102,7 @@ def test_sliders(device: Device) -> None:
 
 
 def test_active_eq_preset(device: Device) -> None:
-    eq_preset = random.choice(_EQ_PRESETS)
+    eq_preset = random.choice(sorted(_EQ_PRESETS))
     device.set_active_eq_preset(eq_preset)
 
     time.sleep(1)  # takes about half a second to settle
@@ -103,6 +110,11 @@ def test_active_eq_preset(device: Device) -> None:
     assert device.get_active_eq_preset() == eq_preset
 
 
+def test_invalid_eq_preset(device: Device) -> None:
+    with pytest.raises(ValueError):
+        device.set_active_eq_preset(max(_EQ_PRESETS) + 1)
+
+
 def test_eq_preset_name(device: Device) -> None:
     preset_names = {
         preset: "".join(
@@ -120,6 +132,11 @@ def test_eq_preset_name(device: Device) -> None:
         assert device.get_eq_preset_name(preset, saved=True) == name
 
 
+def test_eq_preset_name_too_long(device: Device) -> None:
+    with pytest.raises(ValueError):
+        device.set_eq_preset_name(1, "x" * (_EQ_PRESET_MAX_NAME_LENGTH + 1))
+
+
 def test_get_battery_status(device: Device) -> None:
     battery_status = device.get_battery_status()
     assert isinstance(battery_status.is_charging, bool)
@@ -203,3 +220,74 @@ def test_eq_preset_freq_and_bw(device: Device) -> None:
             freq_and_bw = device.get_eq_preset_freq_and_bw(preset, band)
             assert freq_and_bw.saved_center_freq == center_freq
             assert freq_and_bw.saved_bandwidth == bandwidth
+
+
+def test_batch(device: Device) -> None:
+    alert_volume = random.randrange(0, 100)
+    with device.batch(max_queued=1) as batch:
+        set_alert_volume = batch.set_alert_volume(alert_volume)
+        get_alert_volume = batch.get_alert_volume()
+        eq_preset_names = {
+            preset: batch.get_eq_preset_name(preset) for preset in _EQ_PRESETS
+        }
+
+    assert set_alert_volume.result() is None
+    assert get_alert_volume.result() == alert_volume
+    for preset, eq_preset_name in eq_preset_names.items():
+        assert eq_preset_name.result() == device.get_eq_preset_name(preset)
+
+
+def test_batch_error(device: Device) -> None:
+    with pytest.raises(ValueError):
+        with device.batch() as batch:
+            batch.set_active_eq_preset(max(_EQ_PRESETS) + 1)
+
+
+def test_async_device(device: Device) -> None:
+    async def set_and_get_alert_volume(alert_volume: int) -> int:
+        async_device = AsyncDevice(device)
+        await async_device.set_alert_volume(alert_volume)
+        active_alert_volume: int = await async_device.get_alert_volume()
+        return active_alert_volume
+
+    alert_volume = random.randrange(0, 100)
+    assert asyncio.run(set_and_get_alert_volume(alert_volume)) == alert_volume
+
+
+def test_snapshot(device: Device) -> None:
+    snapshot = device.snapshot()
+
+    assert snapshot.alert_volume == device.get_alert_volume()
+    assert snapshot.noise_gate_mode == device.get_noise_gate_mode()
+    for slider_type, slider_value in snapshot.slider_values.items():
+        assert slider_value == device.get_slider_value(slider_type)
+    for preset in _EQ_PRESETS:
+        assert snapshot.eq_preset_names[preset] == device.get_eq_preset_name(preset)
+        assert snapshot.eq_preset_gains[preset] == device.get_eq_preset_gain(preset)
+        freqs_and_bws = snapshot.eq_preset_freqs_and_bws[preset]
+        for band in _EQ_PRESET_BANDS:
+            freq_and_bw = device.get_eq_preset_freq_and_bw(preset, band)
+            assert freqs_and_bws[band] == freq_and_bw
+
+
+def test_copy_and_pickle_results(device: Device) -> None:
+    snapshot = device.snapshot()
+
+    assert copy.copy(snapshot) == snapshot
+    assert copy.deepcopy(snapshot) == snapshot
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+
+
+def test_shared_handle(device: Device) -> None:
+    with Device() as other_device:
+        assert other_device.get_alert_volume() == device.get_alert_volume()
+
+    assert 0 <= device.get_alert_volume() <= 100
+
+
+def test_closed_device() -> None:
+    device = Device()
+    device.close()
+
+    with pytest.raises(RuntimeError):
+        device.get_alert_volume()